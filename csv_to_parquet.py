@@ -0,0 +1,58 @@
+"""
+Este script convierte todos los archivos CSV anuales
+a Parquet de una sola vez.
+
+Los demás scripts generan estos espejos bajo demanda,
+pero correr este script después de actualizar ./data
+evita pagar la conversión durante el primer reporte.
+"""
+
+import os
+
+import pandas as pd
+
+
+def convertir_todos():
+    """
+    Convierte cada archivo CSV dentro de ./data a Parquet
+    si aún no existe o si el CSV es más reciente.
+    """
+
+    archivos = sorted(
+        archivo for archivo in os.listdir("./data") if archivo.endswith(".csv")
+    )
+
+    for archivo in archivos:
+        ruta_csv = f"./data/{archivo}"
+        ruta_parquet = ruta_csv.replace(".csv", ".parquet")
+
+        # Solo convertimos el archivo si hace falta.
+        if os.path.exists(ruta_parquet) and os.path.getmtime(
+            ruta_parquet
+        ) >= os.path.getmtime(ruta_csv):
+            continue
+
+        df = pd.read_csv(ruta_csv, parse_dates=["fechamonitoreo"], engine="pyarrow")
+
+        # Reducimos los tipos de las columnas que usan las gráficas:
+        # float32 ocupa la mitad de memoria y clavesih como categoría
+        # hace que los filtros comparen enteros en lugar de texto.
+        df = df.astype(
+            {
+                "clavesih": "category",
+                "almacenaactual": "float32",
+                "namoalmac": "float32",
+            }
+        )
+
+        # Ordenamos por clave para que cada presa quede contigua y
+        # los grupos de filas pequeños permitan saltar las demás.
+        df = df.sort_values(["clavesih", "fechamonitoreo"])
+
+        df.to_parquet(ruta_parquet, index=False, row_group_size=5_000)
+
+        print("Convertido:", archivo)
+
+
+if __name__ == "__main__":
+    convertir_todos()
@@ -1,142 +1,223 @@
-"""
-Este script se encarga de descargar y consolidar
-los datos del nivel de llenado de presas en México.
-"""
-
-import os
-from datetime import datetime, timedelta
-
-import pandas as pd
-import requests
-
-
-# Esta es la URL de la API.
-URL_BASE = "https://sinav30.conagua.gob.mx:8080/PresasPG/presas/reporte/{}"
-
-HEADERS = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:122.0) Gecko/20100101 Firefox/122.0"
-}
-
-
-def descargar(año):
-    """
-    Esta función descarga los datos para
-    el año especificado.
-
-    Parameters
-    ----------
-    año : int
-        El año que deseamos descargar.
-
-    """
-
-    # Creamos la carpeta para guardar los archivos JSON.
-    os.makedirs("./archivos", exist_ok=True)
-
-    # Cargamos la lista de los archivos previamente descargados.
-    archivos_guardados = os.listdir("./archivos")
-
-    # Definimos la fecha de inicio y de fin, las cuales son
-    # el primero de enero del año especificado y del año siguiente.
-    # El primero de enero del siguiente año será ignorado.
-    fecha_inicio = datetime(año, 1, 1)
-    fecha_fin = datetime(año + 1, 1, 1)
-
-    # Alternativamente podemos limitar la búqueda hasta el día actual.
-    fecha_fin = datetime.today()
-
-    # Calculamos la diferencia de días entre ambas fechas.
-    dias = (fecha_fin - fecha_inicio).days
-
-    for i in range(dias):
-        # Calculamos la fecha a descargar.
-        nueva_fecha = fecha_inicio + timedelta(days=i)
-        nueva_fecha_str = f"{nueva_fecha.year}-{str(nueva_fecha.month).zfill(2)}-{str(nueva_fecha.day).zfill(2)}"
-
-        # Definimos el nombre del archivo a guardar.
-        nombre_archivo = f"{nueva_fecha_str}.json"
-        url_nueva = URL_BASE.format(nueva_fecha_str)
-
-        # Si el archivo ya existe, nos lo saltamos.
-        # De lo contrario, lo descargamos.
-        if nombre_archivo not in archivos_guardados:
-            with requests.get(url_nueva, headers=HEADERS) as respuesta:
-                open(f"./archivos/{nombre_archivo}", "w", encoding="utf-8").write(
-                    respuesta.text
-                )
-                print("Descargado:", nombre_archivo)
-
-
-def combinar(año):
-    """
-    Esta función une todos los archivos JSON del año
-    especificado.
-
-    Parameters
-    ----------
-    año : int
-        El año que deseamos consolidar.
-
-    """
-
-    # Creamos la carpeta para guardar los archivos CSV consolidados.
-    os.makedirs("./data", exist_ok=True)
-
-    # Esta lista almacenará los DataFrames de cada archivo JSON.
-    dfs = list()
-
-    # Iteramos sobre la lista de archivos descargados y
-    # solo tomamos los del año especificado.
-    for archivo in os.listdir("./archivos"):
-        if str(año) in archivo:
-            # Cargamos el archivo JSOn y agregamos el DataFrame a la lista.
-            df = pd.read_json(f"./archivos/{archivo}")
-            dfs.append(df)
-
-    # Unimos todos los DataFrames.
-    final = pd.concat(dfs, axis=0)
-
-    # Las columnas de texto suelen tener espacios en blanco.
-    # Con este ciclo las limpiamos.
-    for col in final.columns:
-        if final[col].dtype == "object":
-            final[col] = final[col].str.strip()
-
-    # Guardamos el DataFrame consolidado.
-    final.to_csv(f"./data/{año}.csv", index=False, encoding="utf-8")
-
-
-def generar_catalogo():
-    """
-    GEnera un catálogo con los datos de cada presa.
-    """
-
-    # Definioms la fecha del catálogo.
-    fecha = datetime(2024, 1, 1)
-    fecha_str = f"{fecha.year}-{str(fecha.month).zfill(2)}-{str(fecha.day).zfill(2)}"
-
-    # Preparamos la URL y hacemos la petición.
-    url = URL_BASE.format(fecha_str)
-
-    with requests.get(url, headers=HEADERS) as respuesta:
-        # Convertimos la respuesta a DataFrame.
-        df = pd.DataFrame.from_records(respuesta.json())
-
-        # Quitamos las columnas que no necesitamos.
-        df = df.iloc[:, 2:-3]
-
-        # Limpiamos el nombre com;un.
-        df["nombrecomun"] = df["nombrecomun"].apply(
-            lambda x: ", ".join([item.strip() for item in x.split(",")])
-            if x is not None
-            else x
-        )
-
-        # Guardamos el DataFrame a CSV.
-        df.to_csv("./catalogo.csv", index=False, encoding="utf-8")
-
-
-if __name__ == "__main__":
-    descargar(2024)
-    combinar(2024)
-    generar_catalogo()
+"""
+Este script se encarga de descargar y consolidar
+los datos del nivel de llenado de presas en México.
+"""
+
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import orjson
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv
+import requests
+from requests.adapters import HTTPAdapter, Retry
+
+
+# Esta es la URL de la API.
+URL_BASE = "https://sinav30.conagua.gob.mx:8080/PresasPG/presas/reporte/{}"
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:122.0) Gecko/20100101 Firefox/122.0"
+}
+
+# El número máximo de descargas simultáneas.
+MAX_DESCARGAS = 8
+
+# Usamos una sola sesión para reutilizar las conexiones
+# y reintentar las peticiones fallidas.
+# Cuando el servidor nos pide esperar (Retry-After),
+# respetamos su indicación antes de reintentar.
+SESION = requests.Session()
+SESION.headers.update(HEADERS)
+SESION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_maxsize=MAX_DESCARGAS * 2,
+        max_retries=Retry(
+            total=5,
+            backoff_factor=0.3,
+            status_forcelist=[429, 500, 502, 503, 504],
+            respect_retry_after_header=True,
+        ),
+    ),
+)
+
+
+def descargar(año):
+    """
+    Esta función descarga los datos para
+    el año especificado.
+
+    Parameters
+    ----------
+    año : int
+        El año que deseamos descargar.
+
+    """
+
+    # Creamos la carpeta para guardar los archivos JSON.
+    os.makedirs("./archivos", exist_ok=True)
+
+    # Cargamos la lista de los archivos previamente descargados.
+    # Usamos un set para que la búsqueda sea instantánea.
+    archivos_guardados = set(os.listdir("./archivos"))
+
+    # Definimos la fecha de inicio y de fin, las cuales son
+    # el primero de enero del año especificado y del año siguiente.
+    # El primero de enero del siguiente año será ignorado.
+    fecha_inicio = datetime(año, 1, 1)
+    fecha_fin = datetime(año + 1, 1, 1)
+
+    # Alternativamente podemos limitar la búqueda hasta el día actual.
+    fecha_fin = datetime.today()
+
+    # Calculamos la diferencia de días entre ambas fechas.
+    dias = (fecha_fin - fecha_inicio).days
+
+    # Juntamos las fechas que aún no han sido descargadas.
+    fechas_pendientes = list()
+
+    for i in range(dias):
+        # Calculamos la fecha a descargar.
+        nueva_fecha = fecha_inicio + timedelta(days=i)
+        nueva_fecha_str = nueva_fecha.date().isoformat()
+
+        # Si el archivo ya existe, nos lo saltamos.
+        if f"{nueva_fecha_str}.json" not in archivos_guardados:
+            fechas_pendientes.append(nueva_fecha_str)
+
+    # Descargamos varias fechas a la vez para no esperar
+    # la respuesta del servidor entre cada petición.
+    # Consumimos el iterador para que cualquier error
+    # durante las descargas vuelva a propagarse.
+    with ThreadPoolExecutor(max_workers=MAX_DESCARGAS) as ejecutor:
+        list(ejecutor.map(descargar_fecha, fechas_pendientes))
+
+
+def descargar_fecha(fecha_str):
+    """
+    Esta función descarga el archivo JSON de
+    la fecha especificada.
+
+    Parameters
+    ----------
+    fecha_str : str
+        La fecha que deseamos descargar (aaaa-mm-dd).
+
+    """
+
+    # Definimos el nombre del archivo a guardar.
+    nombre_archivo = f"{fecha_str}.json"
+    url_nueva = URL_BASE.format(fecha_str)
+
+    with SESION.get(url_nueva) as respuesta:
+        open(f"./archivos/{nombre_archivo}", "w", encoding="utf-8").write(
+            respuesta.text
+        )
+        print("Descargado:", nombre_archivo)
+
+
+def combinar(año):
+    """
+    Esta función une todos los archivos JSON del año
+    especificado.
+
+    Parameters
+    ----------
+    año : int
+        El año que deseamos consolidar.
+
+    """
+
+    # Creamos la carpeta para guardar los archivos CSV consolidados.
+    os.makedirs("./data", exist_ok=True)
+
+    # Juntamos las rutas de los archivos del año especificado.
+    rutas = sorted(glob.glob(f"./archivos/{año}-*.json"))
+
+    # Esta lista almacenará los registros de cada archivo JSON.
+    registros = list()
+
+    # Repartimos el decodificado entre todos los núcleos disponibles.
+    with ProcessPoolExecutor() as ejecutor:
+        for parte in ejecutor.map(parsear_archivo, rutas, chunksize=8):
+            registros.extend(parte)
+
+    # Convertimos todos los registros a DataFrame en una sola pasada.
+    final = pd.DataFrame.from_records(registros)
+
+    # Las columnas de texto suelen tener espacios en blanco.
+    # Las convertimos a tipo Arrow para que la limpieza
+    # se haga con un kernel vectorizado en C.
+    # Usamos is_string_dtype porque pandas 3 infiere el nuevo
+    # tipo str en lugar de object para el texto.
+    for col in final.columns:
+        if pd.api.types.is_string_dtype(final[col]):
+            final[col] = final[col].astype("string[pyarrow]").str.strip()
+
+    # Guardamos el DataFrame consolidado.
+    # pyarrow serializa el CSV en C con varios hilos.
+    pa.csv.write_csv(
+        pa.Table.from_pandas(final, preserve_index=False), f"./data/{año}.csv"
+    )
+
+
+def parsear_archivo(ruta):
+    """
+    Esta función decodifica el archivo JSON especificado.
+
+    Parameters
+    ----------
+    ruta : str
+        La ruta del archivo que deseamos decodificar.
+
+    Returns
+    -------
+    list
+        Los registros del archivo.
+
+    """
+
+    with open(ruta, "rb") as temp:
+        return orjson.loads(temp.read())
+
+
+def generar_catalogo():
+    """
+    GEnera un catálogo con los datos de cada presa.
+    """
+
+    # Definioms la fecha del catálogo.
+    fecha = datetime(2024, 1, 1)
+    fecha_str = f"{fecha.year}-{str(fecha.month).zfill(2)}-{str(fecha.day).zfill(2)}"
+
+    # Preparamos la URL y hacemos la petición.
+    url = URL_BASE.format(fecha_str)
+
+    with SESION.get(url) as respuesta:
+        # Convertimos la respuesta a DataFrame.
+        df = pd.DataFrame.from_records(respuesta.json())
+
+        # Quitamos las columnas que no necesitamos.
+        df = df.iloc[:, 2:-3]
+
+        # Limpiamos el nombre com;un normalizando los
+        # espacios alrededor de las comas.
+        df["nombrecomun"] = (
+            df["nombrecomun"].str.replace(r"\s*,\s*", ", ", regex=True).str.strip()
+        )
+
+        # Guardamos el DataFrame a CSV.
+        # pyarrow serializa el CSV en C con varios hilos.
+        pa.csv.write_csv(
+            pa.Table.from_pandas(df, preserve_index=False), "./catalogo.csv"
+        )
+
+
+if __name__ == "__main__":
+    descargar(2024)
+    combinar(2024)
+    generar_catalogo()
@@ -1,414 +1,628 @@
-import os
-
-import pandas as pd
-import plotly.graph_objects as go
-from PIL import Image
-
-
-ENTIDADES = {
-    "Ags.": "Aguascalientes",
-    "B.C.": "Baja California",
-    "Chih.": "Chihuahua",
-    "Chis.": "Chiapas",
-    "Coah.": "Coahuila",
-    "Col.": "Colima",
-    "Dgo.": "Durango",
-    "Gro.": "Guerrero",
-    "Gto.": "Guanajuato",
-    "Hgo.": "Hidalgo",
-    "Jal.": "Jalisco",
-    "Mich.": "Michoacán",
-    "Mor.": "Morelos",
-    "Méx.": "Estado de México",
-    "N.L.": "Nuevo León",
-    "Nay.": "Nayarit",
-    "Oax.": "Oaxaca",
-    "Pue.": "Puebla",
-    "Qro.": "Querétaro",
-    "S.L.P.": "San Luis Potosí",
-    "Sin.": "Sinaloa",
-    "Son.": "Sonora",
-    "Tamps.": "Tamaulipas",
-    "Tlax.": "Tlaxcala",
-    "Ver.": "Veracruz",
-    "Zac.": "Zacatecas",
-}
-
-# La fecha que se mostrará en la fuente.
-FECHA_FUENTE = "abril 2024"
-
-
-def main(presa_id):
-    """
-    Inicia el reporte de la presa especificada.
-
-    Se crean dos gráficas de vela con los datos
-    mensuales de los últimos 15 años.
-
-    Parameters
-    ----------
-    presa_id : str
-        El identificador de la presa que queremos graficar.
-
-    """
-
-    # Cargamos y filtramos el catálogo de presas.
-    catalogo = pd.read_csv("./catalogo.csv")
-    catalogo = catalogo[catalogo["clavesih"] == presa_id]
-
-    # Obtenemos el NAMO.
-    namo = catalogo["namoalmac"].iloc[0]
-
-    # Obtenemos el nombre común de la presa y lo limpiamos.
-    nombre, estado = catalogo["nombrecomun"].iloc[0].split(",")
-    nombre = ", ".join([nombre, ENTIDADES[estado.strip()]])
-
-    # Vamos a juntar todos los DataFrames en uno solo.
-    dfs = list()
-    cols = ["fechamonitoreo", "clavesih", "almacenaactual", "namoalmac"]
-
-    # Iteramos sobre los archivos anuales.
-    for file in os.listdir("./data")[-15:]:
-        # Cargamos el dataset con las columnas especificadas.
-        df = pd.read_csv(f"./data/{file}", parse_dates=["fechamonitoreo"], usecols=cols)
-
-        # Seleccionamos la presa de nuestro interés.
-        df = df[df["clavesih"] == presa_id]
-
-        # Agregamos el DataFrame a la lista de DataFrames.
-        dfs.append(df)
-
-    # Consolidamos todos los DataFrames.
-    completo = pd.concat(dfs, axis=0)
-
-    # Llamamos las siguientes funciones para crear las gráficas.
-    plot_candle(completo, nombre, namo)
-    plot_candle_perc(completo, nombre, namo)
-    combinar_imagenes(presa_id)
-
-
-def plot_candle(df, nombre, namo):
-    """
-    Crea una gráfica de velas con el nivel de almacenamiento
-    de las presas especificadas.
-
-    Parameters
-    ----------
-    df : pandas.DataFrame
-        El DataFrame con los datos de la presa.
-
-    nomre : str
-        El nomre común de la presa.
-
-    namo : float
-        el nivel de almacenamiento máximo ordinario.
-
-    """
-
-    # Transformamos el DataFrame para que las columnas sean las presas
-    # y los valores el nivel actual de llenado.
-    df = df.pivot_table(
-        index="fechamonitoreo",
-        columns="clavesih",
-        values="almacenaactual",
-        aggfunc="last",
-    )
-
-    # Calculamos el total de llenado de todas las presas.
-    df["total"] = df.sum(axis=1)
-
-    # Quitamos los picos en la serie de tiempo.
-    df = df.rolling(7).median()
-
-    # Transformamos los datos en valores OHLC mensuales.
-    df = df["total"].resample("MS").ohlc()
-
-    fig = go.Figure()
-
-    fig.add_trace(
-        go.Candlestick(
-            x=df.index,
-            open=df["open"],
-            high=df["high"],
-            low=df["low"],
-            close=df["close"],
-            increasing_line_color="#84ffff",
-            decreasing_line_color="#ff9800",
-        )
-    )
-
-    fig.update_xaxes(
-        rangeslider_visible=False,
-        ticks="outside",
-        tickformat="%m<br>%Y",
-        tickfont_size=14,
-        ticklen=10,
-        zeroline=False,
-        tickcolor="#FFFFFF",
-        linewidth=1,
-        showline=True,
-        showgrid=True,
-        gridwidth=0.5,
-        mirror=True,
-        nticks=25,
-    )
-
-    fig.update_yaxes(
-        title="Almacenamiento actual en hm<sup>3</sup>",
-        ticks="outside",
-        separatethousands=True,
-        titlefont_size=18,
-        tickfont_size=14,
-        ticklen=10,
-        title_standoff=6,
-        tickcolor="#FFFFFF",
-        linewidth=1,
-        gridwidth=0.5,
-        showline=True,
-        nticks=20,
-        zeroline=True,
-        zerolinewidth=1,
-        mirror=True,
-    )
-
-    fig.update_layout(
-        legend_itemsizing="constant",
-        showlegend=False,
-        legend_borderwidth=1,
-        legend_bordercolor="#FFFFFF",
-        legend_font_size=20,
-        legend_x=0.5,
-        legend_y=0.05,
-        legend_xanchor="center",
-        legend_yanchor="bottom",
-        width=1280,
-        height=720,
-        font_family="Lato",
-        font_color="#FFFFFF",
-        font_size=18,
-        title_text=f"Evolución del volumen de almacenamiento de la presa <b>{nombre}</b> (NAMO: <b>{namo:,.1f} hm<sup>3</sup></b>)",
-        title_x=0.5,
-        title_y=0.975,
-        margin_t=50,
-        margin_r=40,
-        margin_b=100,
-        margin_l=100,
-        title_font_size=22,
-        plot_bgcolor="#000000",
-        paper_bgcolor="#282A3A",
-        annotations=[
-            dict(
-                x=0.01,
-                y=-0.16,
-                xref="paper",
-                yref="paper",
-                xanchor="left",
-                yanchor="top",
-                text=f"Fuente: CONAGUA ({FECHA_FUENTE})",
-            ),
-            dict(
-                x=0.5,
-                y=-0.16,
-                xref="paper",
-                yref="paper",
-                xanchor="center",
-                yanchor="top",
-                text="Mes y año de registro",
-            ),
-            dict(
-                x=1.01,
-                y=-0.16,
-                xref="paper",
-                yref="paper",
-                xanchor="right",
-                yanchor="top",
-                text="🧁 @lapanquecita",
-            ),
-        ],
-    )
-
-    fig.write_image("./1.png")
-
-
-def plot_candle_perc(df, nombre, namo):
-    """
-    Crea una gráfica de velas con el nivel de almacenamiento
-    de las presas especificadas.
-
-    A diferencia de la otra función, esta muestra los valores
-    en porcentaje respecto al NAMO total.
-
-    Parameters
-    ----------
-    df : pandas.DataFrame
-        El DataFrame con los datos de la presa.
-
-    nomre : str
-        El nomre común de la presa.
-
-    namo : float
-        el nivel de almacenamiento máximo ordinario.
-
-    """
-
-    # Extraemos el NAMO diario, que será usado para calcular el porcentaje de llenado.
-    namo_diario = df.groupby(df["fechamonitoreo"]).sum(numeric_only=True)["namoalmac"]
-
-    # Transformamos el DataFrame para que las columnas sean las presas
-    # y los valores el nivel actual de llenado.
-    df = df.pivot_table(
-        index="fechamonitoreo",
-        columns="clavesih",
-        values="almacenaactual",
-        aggfunc="last",
-    )
-
-    # Calculamos el porcentaje de llenado de todas las presas.
-    df["total"] = df.sum(axis=1) / namo_diario * 100
-
-    # Quitamos los picos en la serie de tiempo.
-    df = df.rolling(7).median()
-
-    # Transformamos los datos en valores OHLC mensuales.
-    df = df["total"].resample("MS").ohlc()
-
-    fig = go.Figure()
-
-    fig.add_trace(
-        go.Candlestick(
-            x=df.index,
-            open=df["open"],
-            high=df["high"],
-            low=df["low"],
-            close=df["close"],
-            increasing_line_color="#84ffff",
-            decreasing_line_color="#ff9800",
-        )
-    )
-
-    fig.update_xaxes(
-        rangeslider_visible=False,
-        ticks="outside",
-        tickformat="%m<br>%Y",
-        tickfont_size=14,
-        ticklen=10,
-        zeroline=False,
-        tickcolor="#FFFFFF",
-        linewidth=1,
-        showline=True,
-        showgrid=True,
-        gridwidth=0.5,
-        mirror=True,
-        nticks=25,
-    )
-
-    fig.update_yaxes(
-        title="Almacenamiento actual respecto al nivel máximo ordinario",
-        ticksuffix="%",
-        ticks="outside",
-        separatethousands=True,
-        titlefont_size=18,
-        tickfont_size=14,
-        ticklen=10,
-        title_standoff=6,
-        tickcolor="#FFFFFF",
-        linewidth=1,
-        gridwidth=0.5,
-        showline=True,
-        nticks=20,
-        zeroline=True,
-        zerolinewidth=1,
-        mirror=True,
-    )
-
-    fig.update_layout(
-        legend_itemsizing="constant",
-        showlegend=False,
-        legend_borderwidth=1,
-        legend_bordercolor="#FFFFFF",
-        legend_font_size=20,
-        legend_x=0.5,
-        legend_y=0.05,
-        legend_xanchor="center",
-        legend_yanchor="bottom",
-        width=1280,
-        height=720,
-        font_family="Lato",
-        font_color="#FFFFFF",
-        font_size=18,
-        title_text=f"Evolución del volumen de almacenamiento de la presa <b>{nombre}</b> (NAMO: <b>{namo:,.1f} hm<sup>3</sup></b>)",
-        title_x=0.5,
-        title_y=0.975,
-        margin_t=50,
-        margin_r=40,
-        margin_b=100,
-        margin_l=100,
-        title_font_size=22,
-        plot_bgcolor="#000000",
-        paper_bgcolor="#282A3A",
-        annotations=[
-            dict(
-                x=0.01,
-                y=-0.16,
-                xref="paper",
-                yref="paper",
-                xanchor="left",
-                yanchor="top",
-                text=f"Fuente: CONAGUA ({FECHA_FUENTE})",
-            ),
-            dict(
-                x=0.5,
-                y=-0.16,
-                xref="paper",
-                yref="paper",
-                xanchor="center",
-                yanchor="top",
-                text="Mes y año de registro",
-            ),
-            dict(
-                x=1.01,
-                y=-0.16,
-                xref="paper",
-                yref="paper",
-                xanchor="right",
-                yanchor="top",
-                text="🧁 @lapanquecita",
-            ),
-        ],
-    )
-
-    fig.write_image("./2.png")
-
-
-def combinar_imagenes(presa_id):
-    """
-    Esta función une las dos imágenes generadas por
-    las otras funciones.
-
-    Parameters
-    ----------
-    presa_id : str
-        El identificador de la presa. Usado para nombrar el archivo final.
-
-    """
-
-    # Cargamos las imágenes.
-    imagen1 = Image.open("./1.png")
-    imagen2 = Image.open("./2.png")
-
-    # Definimos las dimensiones del lienzo.
-    reusltado_ancho = 1280
-    resultado_alto = imagen1.height + imagen2.height
-
-    # Copiamos los pixeles al lienzo.
-    resultado = Image.new("RGB", (reusltado_ancho, resultado_alto))
-    resultado.paste(im=imagen1, box=(0, 0))
-    resultado.paste(im=imagen2, box=(0, imagen1.height * 1))
-
-    # Gaurdamos la imagen final.
-    resultado.save(f"./{presa_id}.png")
-
-
-if __name__ == "__main__":
-    # main("ARCSO")
-    main("VBRMX")
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+from PIL import Image
+
+
+ENTIDADES = {
+    "Ags.": "Aguascalientes",
+    "B.C.": "Baja California",
+    "Chih.": "Chihuahua",
+    "Chis.": "Chiapas",
+    "Coah.": "Coahuila",
+    "Col.": "Colima",
+    "Dgo.": "Durango",
+    "Gro.": "Guerrero",
+    "Gto.": "Guanajuato",
+    "Hgo.": "Hidalgo",
+    "Jal.": "Jalisco",
+    "Mich.": "Michoacán",
+    "Mor.": "Morelos",
+    "Méx.": "Estado de México",
+    "N.L.": "Nuevo León",
+    "Nay.": "Nayarit",
+    "Oax.": "Oaxaca",
+    "Pue.": "Puebla",
+    "Qro.": "Querétaro",
+    "S.L.P.": "San Luis Potosí",
+    "Sin.": "Sinaloa",
+    "Son.": "Sonora",
+    "Tamps.": "Tamaulipas",
+    "Tlax.": "Tlaxcala",
+    "Ver.": "Veracruz",
+    "Zac.": "Zacatecas",
+}
+
+# La fecha que se mostrará en la fuente.
+FECHA_FUENTE = "abril 2024"
+
+# Configuramos el renderizado una sola vez para reutilizar
+# el mismo proceso de Kaleido en todas las gráficas.
+# Las versiones recientes de plotly exponen la configuración
+# en pio.defaults y ya no incluyen el scope anterior.
+if hasattr(pio, "defaults"):
+    pio.defaults.default_format = "png"
+    pio.defaults.default_width = 1280
+    pio.defaults.default_height = 720
+elif hasattr(pio.kaleido, "scope"):
+    pio.kaleido.scope.default_format = "png"
+    pio.kaleido.scope.default_width = 1280
+    pio.kaleido.scope.default_height = 720
+
+# Registramos la plantilla con el estilo compartido de las gráficas
+# para no reconstruirlo en cada llamada.
+pio.templates["conagua"] = go.layout.Template(
+    layout=dict(
+        font_family="Lato",
+        font_color="#FFFFFF",
+        font_size=18,
+        title_x=0.5,
+        plot_bgcolor="#000000",
+        paper_bgcolor="#282A3A",
+    )
+)
+
+
+def main(presa_id):
+    """
+    Inicia el reporte de la presa especificada.
+
+    Se crean dos gráficas de vela con los datos
+    mensuales de los últimos 15 años.
+
+    Parameters
+    ----------
+    presa_id : str
+        El identificador de la presa que queremos graficar.
+
+    """
+
+    # Buscamos la presa especificada en el catálogo.
+    presa = cargar_catalogo().loc[presa_id]
+
+    # Obtenemos el NAMO.
+    namo = presa["namoalmac"]
+
+    # Obtenemos el nombre común de la presa y lo limpiamos.
+    nombre, estado = presa["nombrecomun"].split(",")
+    nombre = ", ".join([nombre, ENTIDADES[estado.strip()]])
+
+    # Cargamos los registros consolidados de la presa.
+    completo = cargar_datos(presa_id)
+
+    # Preparamos las cifras absolutas y porcentuales una sola vez.
+    ohlc_abs, ohlc_perc = preparar_ohlc(completo)
+
+    # Llamamos las siguientes funciones para crear las gráficas.
+    imagen1 = plot_candle(ohlc_abs, nombre, namo)
+    imagen2 = plot_candle_perc(ohlc_perc, nombre, namo)
+    combinar_imagenes(imagen1, imagen2, presa_id)
+
+
+@lru_cache(maxsize=1)
+def cargar_catalogo():
+    """
+    Carga el catálogo de presas indexado por clave.
+
+    El resultado se guarda en memoria para no releer
+    el archivo en cada reporte.
+
+    Returns
+    -------
+    pandas.DataFrame
+        El catálogo de presas indexado por clavesih.
+
+    """
+
+    return pd.read_csv("./catalogo.csv", engine="pyarrow").set_index("clavesih")
+
+
+@lru_cache(maxsize=None)
+def cargar_datos(presa_id):
+    """
+    Carga y consolida los registros anuales de la presa especificada.
+
+    El resultado se guarda en memoria para que generar varios
+    reportes en una misma sesión no repita las lecturas.
+
+    Parameters
+    ----------
+    presa_id : str
+        El identificador de la presa que queremos cargar.
+
+    Returns
+    -------
+    pandas.DataFrame
+        El DataFrame con los registros diarios de la presa.
+
+    """
+
+    # Juntamos los archivos anuales más recientes.
+    archivos = archivos_recientes()
+
+    # Leemos varios archivos anuales a la vez, ya que pyarrow
+    # libera el GIL durante la lectura.
+    with ThreadPoolExecutor(max_workers=8) as ejecutor:
+        dfs = list(
+            ejecutor.map(lambda archivo: cargar_año(archivo, presa_id), archivos)
+        )
+
+    # Consolidamos todos los DataFrames.
+    # Descartamos los índices originales para evitar
+    # el trabajo de reindexado en la unión.
+    completo = pd.concat(dfs, axis=0, ignore_index=True)
+
+    # Unificamos las categorías de las claves después de unir los años.
+    completo["clavesih"] = completo["clavesih"].astype("category")
+
+    return completo
+
+
+def cargar_año(archivo, presa_id):
+    """
+    Carga los registros anuales de la presa especificada.
+
+    Parameters
+    ----------
+    archivo : str
+        El nombre del archivo CSV anual.
+
+    presa_id : str
+        El identificador de la presa que queremos cargar.
+
+    Returns
+    -------
+    pandas.DataFrame
+        El DataFrame con los registros del año.
+
+    """
+
+    # Nos aseguramos de contar con la versión Parquet del archivo.
+    ruta_parquet = preparar_parquet(archivo)
+
+    # Cargamos solo las columnas y los registros
+    # de la presa de nuestro interés.
+    cols = ["fechamonitoreo", "clavesih", "almacenaactual", "namoalmac"]
+
+    return pd.read_parquet(
+        ruta_parquet, columns=cols, filters=[("clavesih", "==", presa_id)]
+    )
+
+
+def archivos_recientes(n=15):
+    """
+    Junta los nombres de los archivos CSV anuales más recientes.
+
+    Parameters
+    ----------
+    n : int
+        El número de archivos a conservar.
+
+    Returns
+    -------
+    list
+        Los nombres de los archivos, ordenados por año.
+
+    """
+
+    # Ordenamos explícitamente, ya que el sistema de archivos
+    # no garantiza el orden en que lista los nombres.
+    archivos = sorted(
+        entrada.name
+        for entrada in os.scandir("./data")
+        if entrada.name.endswith(".csv")
+    )
+
+    return archivos[-n:]
+
+
+def preparar_parquet(archivo):
+    """
+    Convierte el archivo CSV anual especificado a Parquet
+    si aún no existe o si el CSV es más reciente.
+
+    Parameters
+    ----------
+    archivo : str
+        El nombre del archivo CSV anual.
+
+    Returns
+    -------
+    str
+        La ruta del archivo Parquet equivalente.
+
+    """
+
+    ruta_csv = f"./data/{archivo}"
+    ruta_parquet = ruta_csv.replace(".csv", ".parquet")
+
+    # Solo convertimos el archivo si hace falta.
+    if not os.path.exists(ruta_parquet) or os.path.getmtime(
+        ruta_parquet
+    ) < os.path.getmtime(ruta_csv):
+        df = pd.read_csv(ruta_csv, parse_dates=["fechamonitoreo"], engine="pyarrow")
+
+        # Reducimos los tipos de las columnas que usan las gráficas:
+        # float32 ocupa la mitad de memoria y clavesih como categoría
+        # hace que los filtros comparen enteros en lugar de texto.
+        df = df.astype(
+            {
+                "clavesih": "category",
+                "almacenaactual": "float32",
+                "namoalmac": "float32",
+            }
+        )
+
+        # Ordenamos por clave para que cada presa quede contigua y
+        # los grupos de filas pequeños permitan saltar las demás.
+        df = df.sort_values(["clavesih", "fechamonitoreo"])
+
+        df.to_parquet(ruta_parquet, index=False, row_group_size=5_000)
+
+    return ruta_parquet
+
+
+def preparar_ohlc(df):
+    """
+    Prepara los valores OHLC mensuales en cifras
+    absolutas y porcentuales.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        El DataFrame con los registros diarios de la presa.
+
+    Returns
+    -------
+    tuple
+        Los DataFrames OHLC con cifras absolutas y porcentuales.
+
+    """
+
+    # Como los registros son de una sola presa no necesitamos
+    # una tabla pivote: basta con quedarnos con el último
+    # registro de cada día.
+    # Reducimos ambas columnas en una sola pasada.
+    diario = df.groupby("fechamonitoreo")[["almacenaactual", "namoalmac"]].last()
+
+    # El total de llenado y el NAMO diario de la presa.
+    total = diario["almacenaactual"]
+    namo_diario = diario["namoalmac"]
+
+    # Calculamos el porcentaje de llenado de todas las presas.
+    porcentaje = total / namo_diario * 100
+
+    # Quitamos los picos en las series de tiempo y transformamos
+    # los datos en valores OHLC mensuales.
+    # Quitamos los meses sin registros para no graficar velas vacías.
+    ohlc_abs = mediana_movil(total).resample("MS").ohlc().dropna()
+    ohlc_perc = mediana_movil(porcentaje).resample("MS").ohlc().dropna()
+
+    return ohlc_abs, ohlc_perc
+
+
+def mediana_movil(serie, ventana=7):
+    """
+    Calcula la mediana móvil de la serie especificada.
+
+    Opera directamente sobre el arreglo de NumPy para evitar
+    el despacho genérico de pandas en cada ventana.
+
+    Parameters
+    ----------
+    serie : pandas.Series
+        La serie de tiempo diaria.
+
+    ventana : int
+        El tamaño de la ventana.
+
+    Returns
+    -------
+    pandas.Series
+        La serie suavizada con el mismo índice.
+
+    """
+
+    valores = serie.to_numpy(dtype=np.float32)
+
+    # Las ventanas incompletas del inicio quedan como NaN,
+    # igual que con rolling().median().
+    resultado = np.full(len(valores), np.nan, dtype=np.float32)
+
+    if len(valores) >= ventana:
+        ventanas = np.lib.stride_tricks.sliding_window_view(valores, ventana)
+        resultado[ventana - 1 :] = np.median(ventanas, axis=1)
+
+    return pd.Series(resultado, index=serie.index)
+
+
+def plot_candle(df, nombre, namo):
+    """
+    Crea una gráfica de velas con el nivel de almacenamiento
+    de las presas especificadas.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        El DataFrame con los valores OHLC mensuales.
+
+    nomre : str
+        El nomre común de la presa.
+
+    namo : float
+        el nivel de almacenamiento máximo ordinario.
+
+    """
+
+    fig = go.Figure()
+
+    fig.add_trace(
+        go.Candlestick(
+            x=df.index,
+            open=df["open"],
+            high=df["high"],
+            low=df["low"],
+            close=df["close"],
+            increasing_line_color="#84ffff",
+            decreasing_line_color="#ff9800",
+        )
+    )
+
+    fig.update_xaxes(
+        rangeslider_visible=False,
+        ticks="outside",
+        tickformat="%m<br>%Y",
+        tickfont_size=14,
+        ticklen=10,
+        zeroline=False,
+        tickcolor="#FFFFFF",
+        linewidth=1,
+        showline=True,
+        showgrid=True,
+        gridwidth=0.5,
+        mirror=True,
+        nticks=25,
+    )
+
+    fig.update_yaxes(
+        title="Almacenamiento actual en hm<sup>3</sup>",
+        ticks="outside",
+        separatethousands=True,
+        titlefont_size=18,
+        tickfont_size=14,
+        ticklen=10,
+        title_standoff=6,
+        tickcolor="#FFFFFF",
+        linewidth=1,
+        gridwidth=0.5,
+        showline=True,
+        nticks=20,
+        zeroline=True,
+        zerolinewidth=1,
+        mirror=True,
+    )
+
+    fig.update_layout(
+        legend_itemsizing="constant",
+        showlegend=False,
+        legend_borderwidth=1,
+        legend_bordercolor="#FFFFFF",
+        legend_font_size=20,
+        legend_x=0.5,
+        legend_y=0.05,
+        legend_xanchor="center",
+        legend_yanchor="bottom",
+        width=1280,
+        height=720,
+        template="conagua",
+        title_text=f"Evolución del volumen de almacenamiento de la presa <b>{nombre}</b> (NAMO: <b>{namo:,.1f} hm<sup>3</sup></b>)",
+        title_y=0.975,
+        margin_t=50,
+        margin_r=40,
+        margin_b=100,
+        margin_l=100,
+        title_font_size=22,
+        annotations=[
+            dict(
+                x=0.01,
+                y=-0.16,
+                xref="paper",
+                yref="paper",
+                xanchor="left",
+                yanchor="top",
+                text=f"Fuente: CONAGUA ({FECHA_FUENTE})",
+            ),
+            dict(
+                x=0.5,
+                y=-0.16,
+                xref="paper",
+                yref="paper",
+                xanchor="center",
+                yanchor="top",
+                text="Mes y año de registro",
+            ),
+            dict(
+                x=1.01,
+                y=-0.16,
+                xref="paper",
+                yref="paper",
+                xanchor="right",
+                yanchor="top",
+                text="🧁 @lapanquecita",
+            ),
+        ],
+    )
+
+    # Renderizamos la imagen con el proceso compartido de Kaleido.
+    return pio.to_image(fig, validate=False)
+
+
+def plot_candle_perc(df, nombre, namo):
+    """
+    Crea una gráfica de velas con el nivel de almacenamiento
+    de las presas especificadas.
+
+    A diferencia de la otra función, esta muestra los valores
+    en porcentaje respecto al NAMO total.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        El DataFrame con los valores OHLC mensuales.
+
+    nomre : str
+        El nomre común de la presa.
+
+    namo : float
+        el nivel de almacenamiento máximo ordinario.
+
+    """
+
+    fig = go.Figure()
+
+    fig.add_trace(
+        go.Candlestick(
+            x=df.index,
+            open=df["open"],
+            high=df["high"],
+            low=df["low"],
+            close=df["close"],
+            increasing_line_color="#84ffff",
+            decreasing_line_color="#ff9800",
+        )
+    )
+
+    fig.update_xaxes(
+        rangeslider_visible=False,
+        ticks="outside",
+        tickformat="%m<br>%Y",
+        tickfont_size=14,
+        ticklen=10,
+        zeroline=False,
+        tickcolor="#FFFFFF",
+        linewidth=1,
+        showline=True,
+        showgrid=True,
+        gridwidth=0.5,
+        mirror=True,
+        nticks=25,
+    )
+
+    fig.update_yaxes(
+        title="Almacenamiento actual respecto al nivel máximo ordinario",
+        ticksuffix="%",
+        ticks="outside",
+        separatethousands=True,
+        titlefont_size=18,
+        tickfont_size=14,
+        ticklen=10,
+        title_standoff=6,
+        tickcolor="#FFFFFF",
+        linewidth=1,
+        gridwidth=0.5,
+        showline=True,
+        nticks=20,
+        zeroline=True,
+        zerolinewidth=1,
+        mirror=True,
+    )
+
+    fig.update_layout(
+        legend_itemsizing="constant",
+        showlegend=False,
+        legend_borderwidth=1,
+        legend_bordercolor="#FFFFFF",
+        legend_font_size=20,
+        legend_x=0.5,
+        legend_y=0.05,
+        legend_xanchor="center",
+        legend_yanchor="bottom",
+        width=1280,
+        height=720,
+        template="conagua",
+        title_text=f"Evolución del volumen de almacenamiento de la presa <b>{nombre}</b> (NAMO: <b>{namo:,.1f} hm<sup>3</sup></b>)",
+        title_y=0.975,
+        margin_t=50,
+        margin_r=40,
+        margin_b=100,
+        margin_l=100,
+        title_font_size=22,
+        annotations=[
+            dict(
+                x=0.01,
+                y=-0.16,
+                xref="paper",
+                yref="paper",
+                xanchor="left",
+                yanchor="top",
+                text=f"Fuente: CONAGUA ({FECHA_FUENTE})",
+            ),
+            dict(
+                x=0.5,
+                y=-0.16,
+                xref="paper",
+                yref="paper",
+                xanchor="center",
+                yanchor="top",
+                text="Mes y año de registro",
+            ),
+            dict(
+                x=1.01,
+                y=-0.16,
+                xref="paper",
+                yref="paper",
+                xanchor="right",
+                yanchor="top",
+                text="🧁 @lapanquecita",
+            ),
+        ],
+    )
+
+    # Renderizamos la imagen con el proceso compartido de Kaleido.
+    return pio.to_image(fig, validate=False)
+
+
+def combinar_imagenes(imagen1, imagen2, presa_id):
+    """
+    Esta función une las dos imágenes generadas por
+    las otras funciones.
+
+    Parameters
+    ----------
+    imagen1 : bytes
+        Los bytes PNG de la primera imagen.
+
+    imagen2 : bytes
+        Los bytes PNG de la segunda imagen.
+
+    presa_id : str
+        El identificador de la presa. Usado para nombrar el archivo final.
+
+    """
+
+    # Cargamos las imágenes directamente desde la memoria.
+    imagen1 = Image.open(BytesIO(imagen1))
+    imagen2 = Image.open(BytesIO(imagen2))
+
+    # Apilamos los pixeles de ambas imágenes en una sola copia.
+    # Quitamos el canal alfa de Kaleido para publicar
+    # la imagen en RGB, igual que antes.
+    resultado = Image.fromarray(
+        np.concatenate([np.asarray(imagen1), np.asarray(imagen2)], axis=0)
+    ).convert("RGB")
+
+    # Gaurdamos la imagen final.
+    # Un nivel de compresión bajo escribe mucho más rápido
+    # y el PNG resultante apenas crece.
+    resultado.save(f"./{presa_id}.png", compress_level=1)
+
+
+if __name__ == "__main__":
+    # main("ARCSO")
+    main("VBRMX")
@@ -1,555 +1,749 @@
-import os
-
-import pandas as pd
-import plotly.graph_objects as go
-from PIL import Image
-
-
-ENTIDADES = {
-    "Ags.": "Aguascalientes",
-    "B.C.": "Baja California",
-    "Chih.": "Chihuahua",
-    "Chis.": "Chiapas",
-    "Coah.": "Coahuila",
-    "Col.": "Colima",
-    "Dgo.": "Durango",
-    "Gro.": "Guerrero",
-    "Gto.": "Guanajuato",
-    "Hgo.": "Hidalgo",
-    "Jal.": "Jalisco",
-    "Mich.": "Michoacán",
-    "Mor.": "Morelos",
-    "Méx.": "Edo. de México",
-    "N.L.": "Nuevo León",
-    "Nay.": "Nayarit",
-    "Oax.": "Oaxaca",
-    "Pue.": "Puebla",
-    "Qro.": "Querétaro",
-    "S.L.P.": "San Luis Potosí",
-    "Sin.": "Sinaloa",
-    "Son.": "Sonora",
-    "Tamps.": "Tamaulipas",
-    "Tlax.": "Tlaxcala",
-    "Ver.": "Veracruz",
-    "Zac.": "Zacatecas",
-}
-
-# La fecha que se mostrará en la fuente.
-FECHA_FUENTE = "abril 2024"
-
-
-def main(titulo, lado, *presas):
-    """
-    Inicia el reporte de la presa especificada.
-
-    Se crean dos gráficas de vela con los datos
-    mensuales de los últimos 15 años.
-
-    Parameters
-    ----------
-    titulo : str
-        El título que utilizaremos para las gráficas.
-
-    lado : str (left|right)
-        El lado donde se posicionará la anotación.
-
-    presas : str
-        Los identificadores de las presas que queremos graficar.
-
-    """
-
-    # Cargamos y filtramos el catálogo de presas.
-    catalogo = pd.read_csv("./catalogo.csv")
-    catalogo = catalogo[catalogo["clavesih"].isin(presas)]
-
-    # calculamos el NAMO de todas las presas.
-    namo = catalogo["namoalmac"].sum()
-
-    # Obtenemos la lista de nombres comunes de las presas.
-    nombres = list()
-
-    for nombre in catalogo["nombrecomun"]:
-        nombre, estado = nombre.split(", ")
-        nombres.append(f"• {nombre}, {ENTIDADES[estado.strip()]}")
-
-    nombres = "<br>".join(nombres)
-
-    # Vamos a juntar todos los DataFrames en uno solo.
-    dfs = list()
-    cols = ["fechamonitoreo", "clavesih", "almacenaactual", "namoalmac"]
-
-    # Iteramos sobre los archivos anuales.
-    for file in os.listdir("./data")[-15:]:
-        # Cargamos el dataset con las columnas especificadas.
-        df = pd.read_csv(f"./data/{file}", parse_dates=["fechamonitoreo"], usecols=cols)
-
-        # Seleccionamos las presas de nuestro interés.
-        df = df[df["clavesih"].isin(presas)]
-
-        # Agregamos el DataFrame a la lista de DataFrames.
-        dfs.append(df)
-
-    # Consolidamos todos los DataFrames.
-    completo = pd.concat(dfs, axis=0)
-
-    # Llamamos las siguientes funciones para crear las gráficas.
-    plot_candle(completo, nombres, namo, titulo, lado)
-    plot_candle_perc(completo, nombres, namo, titulo, lado)
-    combinar_imagenes()
-
-
-def main_estatal(titulo, entidad, lado):
-    """
-    Inicia el reporte de la presa especificada.
-
-    Se crean dos gráficas de vela con los datos
-    mensuales de los últimos 15 años.
-
-    Parameters
-    ----------
-    titulo : str
-        El título que utilizaremos para las gráficas.
-
-    entidad : str
-        El nombre de la entidad federativa que queremos graficar.
-
-    lado : str (left|right)
-        El lado donde se posicionará la anotación.
-
-    """
-
-    # Cargamos y filtramos el catálogo de presas.
-    catalogo = pd.read_csv("./catalogo.csv")
-    catalogo = catalogo[catalogo["estado"] == entidad]
-
-    claves = catalogo["clavesih"].unique()
-
-    # calculamos el NAMO de todas las presas.
-    namo = catalogo["namoalmac"].sum()
-
-    # Vamos a juntar todos los DataFrames en uno solo.
-    dfs = list()
-    cols = ["fechamonitoreo", "clavesih", "almacenaactual", "namoalmac"]
-
-    # Iteramos sobre los archivos anuales.
-    for file in os.listdir("./data")[-15:]:
-        # Cargamos el dataset con las columnas especificadas.
-        df = pd.read_csv(f"./data/{file}", parse_dates=["fechamonitoreo"], usecols=cols)
-
-        # Seleccionamos las presas de nuestro interés.
-        df = df[df["clavesih"].isin(claves)]
-
-        # Agregamos el DataFrame a la lista de DataFrames.
-        dfs.append(df)
-
-    # Consolidamos todos los DataFrames.
-    completo = pd.concat(dfs, axis=0)
-
-    # Llamamos las siguientes funciones para crear las gráficas.
-    plot_candle(completo, None, namo, titulo, lado)
-    plot_candle_perc(completo, None, namo, titulo, lado)
-    combinar_imagenes()
-
-
-def plot_candle(df, nombres, namo, titulo, lado):
-    """
-    Crea una gráfica de velas con el nivel de almacenamiento
-    de las presas especificadas.
-
-    Parameters
-    ----------
-    df : pandas.DataFrame
-        El DataFrame con los datos de las presas.
-
-    nombres : str
-        Los nombres comunes de las presas.
-
-    namo : float
-        el nivel de almacenamiento máximo ordinario de todas las presas.
-
-    titulo : str
-        El título de la gráfica.
-
-    lado : str (left|right)
-        El lado donde se posicionará la anotación.
-
-    """
-
-    # Transformamos el DataFrame para que las columnas sean las presas
-    # y los valores el nivel actual de llenado.
-    df = df.pivot_table(
-        index="fechamonitoreo",
-        columns="clavesih",
-        values="almacenaactual",
-        aggfunc="last",
-    )
-
-    # Calculamos el total de llenado de todas las presas.
-    df["total"] = df.sum(axis=1)
-
-    # Quitamos los picos en la serie de tiempo.
-    df = df.rolling(7).median()
-
-    # Transformamos los datos en valores OHLC mensuales.
-    df = df["total"].resample("MS").ohlc()
-
-    # Ajustamos el texto de la anotación.
-    if nombres is None:
-        nota = "<b>Nota:</b><br>Cada vela representa las cifras mensuales<br>de las principales presas del estado."
-    else:
-        nota = f"<b>Nota:</b><br>Cada vela representa las cifras<br>mensuales de las presas:<br>{nombres}"
-
-    if lado == "left":
-        xanchor = "left"
-        x_pos = 0.02
-    else:
-        xanchor = "right"
-        x_pos = 1.0
-
-    fig = go.Figure()
-
-    fig.add_trace(
-        go.Candlestick(
-            x=df.index,
-            open=df["open"],
-            high=df["high"],
-            low=df["low"],
-            close=df["close"],
-            increasing_line_color="#84ffff",
-            decreasing_line_color="#ff9800",
-        )
-    )
-
-    fig.update_xaxes(
-        rangeslider_visible=False,
-        ticks="outside",
-        tickformat="%m<br>%Y",
-        tickfont_size=14,
-        ticklen=10,
-        zeroline=False,
-        tickcolor="#FFFFFF",
-        linewidth=1,
-        showline=True,
-        showgrid=True,
-        gridwidth=0.5,
-        mirror=True,
-        nticks=25,
-    )
-
-    fig.update_yaxes(
-        title="Almacenamiento actual en hm<sup>3</sup>",
-        ticks="outside",
-        separatethousands=True,
-        titlefont_size=18,
-        tickfont_size=14,
-        ticklen=10,
-        title_standoff=6,
-        tickcolor="#FFFFFF",
-        linewidth=1,
-        gridwidth=0.5,
-        showline=True,
-        nticks=20,
-        zeroline=True,
-        zerolinewidth=1,
-        mirror=True,
-    )
-
-    fig.update_layout(
-        legend_itemsizing="constant",
-        showlegend=False,
-        legend_borderwidth=1,
-        legend_bordercolor="#FFFFFF",
-        legend_font_size=20,
-        legend_x=0.5,
-        legend_y=0.05,
-        legend_xanchor="center",
-        legend_yanchor="bottom",
-        width=1280,
-        height=720,
-        font_family="Lato",
-        font_color="#FFFFFF",
-        font_size=18,
-        title_text=f"Evolución del volumen de almacenamiento de {titulo} (NAMO: <b>{namo:,.1f} hm<sup>3</sup></b>)",
-        title_x=0.5,
-        title_y=0.975,
-        margin_t=50,
-        margin_r=40,
-        margin_b=100,
-        margin_l=100,
-        title_font_size=22,
-        plot_bgcolor="#000000",
-        paper_bgcolor="#282A3A",
-        annotations=[
-            dict(
-                x=x_pos,
-                y=0.93,
-                xref="paper",
-                yref="paper",
-                xanchor=xanchor,
-                yanchor="top",
-                borderpad=7,
-                bordercolor="#FFFFFF",
-                borderwidth=1,
-                bgcolor="#000000",
-                align="left",
-                text=nota,
-            ),
-            dict(
-                x=0.01,
-                y=-0.16,
-                xref="paper",
-                yref="paper",
-                xanchor="left",
-                yanchor="top",
-                text=f"Fuente: CONAGUA ({FECHA_FUENTE})",
-            ),
-            dict(
-                x=0.5,
-                y=-0.16,
-                xref="paper",
-                yref="paper",
-                xanchor="center",
-                yanchor="top",
-                text="Mes y año de registro",
-            ),
-            dict(
-                x=1.01,
-                y=-0.16,
-                xref="paper",
-                yref="paper",
-                xanchor="right",
-                yanchor="top",
-                text="🧁 @lapanquecita",
-            ),
-        ],
-    )
-
-    fig.write_image("./1.png")
-
-
-def plot_candle_perc(df, nombres, namo, titulo, lado):
-    """
-    Crea una gráfica de velas con el nivel de almacenamiento
-    de las presas especificadas.
-
-    A diferencia de la otra función, esta muestra los valores
-    en porcentaje respecto al NAMO total.
-
-    Parameters
-    ----------
-    df : pandas.DataFrame
-        El DataFrame con los datos de las presas.
-
-    nombres : str
-        Los nombres comunes de las presas.
-
-    namo : float
-        el nivel de almacenamiento máximo ordinario de todas las presas.
-
-    titulo : str
-        El título de la gráfica.
-
-    lado : str (left|right)
-        El lado donde se posicionará la anotación.
-
-    """
-
-    # Extraemos el NAMO diario, que será usado para calcular el porcentaje de llenado.
-    namo_diario = df.groupby(df["fechamonitoreo"]).sum(numeric_only=True)["namoalmac"]
-
-    # Transformamos el DataFrame para que las columnas sean las presas
-    # y los valores el nivel actual de llenado.
-    df = df.pivot_table(
-        index="fechamonitoreo",
-        columns="clavesih",
-        values="almacenaactual",
-        aggfunc="last",
-    )
-
-    # Calculamos el porcentaje de llenado de todas las presas.
-    df["total"] = df.sum(axis=1) / namo_diario * 100
-
-    # Quitamos los picos en la serie de tiempo.
-    df = df.rolling(7).median()
-
-    # Transformamos los datos en valores OHLC mensuales.
-    df = df["total"].resample("MS").ohlc()
-
-    # Ajustamos el texto de la anotación.
-    if nombres is None:
-        nota = "<b>Nota:</b><br>Cada vela representa las cifras mensuales<br>de las principales presas del estado."
-    else:
-        nota = f"<b>Nota:</b><br>Cada vela representa las cifras<br>mensuales de las presas:<br>{nombres}"
-
-    if lado == "left":
-        xanchor = "left"
-        x_pos = 0.02
-    else:
-        xanchor = "right"
-        x_pos = 1.0
-
-    fig = go.Figure()
-
-    fig.add_trace(
-        go.Candlestick(
-            x=df.index,
-            open=df["open"],
-            high=df["high"],
-            low=df["low"],
-            close=df["close"],
-            increasing_line_color="#84ffff",
-            decreasing_line_color="#ff9800",
-        )
-    )
-
-    fig.update_xaxes(
-        rangeslider_visible=False,
-        ticks="outside",
-        tickformat="%m<br>%Y",
-        tickfont_size=14,
-        ticklen=10,
-        zeroline=False,
-        tickcolor="#FFFFFF",
-        linewidth=1,
-        showline=True,
-        showgrid=True,
-        gridwidth=0.5,
-        mirror=True,
-        nticks=25,
-    )
-
-    fig.update_yaxes(
-        title="Almacenamiento actual respecto al nivel máximo ordinario",
-        ticksuffix="%",
-        ticks="outside",
-        separatethousands=True,
-        titlefont_size=18,
-        tickfont_size=14,
-        ticklen=10,
-        title_standoff=6,
-        tickcolor="#FFFFFF",
-        linewidth=1,
-        gridwidth=0.5,
-        showline=True,
-        nticks=20,
-        zeroline=True,
-        zerolinewidth=1,
-        mirror=True,
-    )
-
-    fig.update_layout(
-        legend_itemsizing="constant",
-        showlegend=False,
-        legend_borderwidth=1,
-        legend_bordercolor="#FFFFFF",
-        legend_font_size=20,
-        legend_x=0.5,
-        legend_y=0.05,
-        legend_xanchor="center",
-        legend_yanchor="bottom",
-        width=1280,
-        height=720,
-        font_family="Lato",
-        font_color="#FFFFFF",
-        font_size=18,
-        title_text=f"Evolución del volumen de almacenamiento de {titulo} (NAMO: <b>{namo:,.1f} hm<sup>3</sup></b>)",
-        title_x=0.5,
-        title_y=0.975,
-        margin_t=50,
-        margin_r=40,
-        margin_b=100,
-        margin_l=100,
-        title_font_size=22,
-        plot_bgcolor="#000000",
-        paper_bgcolor="#282A3A",
-        annotations=[
-            dict(
-                x=x_pos,
-                y=0.93,
-                xref="paper",
-                yref="paper",
-                xanchor=xanchor,
-                yanchor="top",
-                borderpad=7,
-                bordercolor="#FFFFFF",
-                borderwidth=1,
-                bgcolor="#000000",
-                align="left",
-                text=nota,
-            ),
-            dict(
-                x=0.01,
-                y=-0.16,
-                xref="paper",
-                yref="paper",
-                xanchor="left",
-                yanchor="top",
-                text=f"Fuente: CONAGUA ({FECHA_FUENTE})",
-            ),
-            dict(
-                x=0.5,
-                y=-0.16,
-                xref="paper",
-                yref="paper",
-                xanchor="center",
-                yanchor="top",
-                text="Mes y año de registro",
-            ),
-            dict(
-                x=1.01,
-                y=-0.16,
-                xref="paper",
-                yref="paper",
-                xanchor="right",
-                yanchor="top",
-                text="🧁 @lapanquecita",
-            ),
-        ],
-    )
-
-    fig.write_image("./2.png")
-
-
-def combinar_imagenes():
-    """
-    Esta función une las dos imágenes generadas por
-    las otras funciones.
-    """
-
-    # Cargamos las imágenes.
-    imagen1 = Image.open("./1.png")
-    imagen2 = Image.open("./2.png")
-
-    # Definimos las dimensiones del lienzo.
-    reusltado_ancho = 1280
-    resultado_alto = imagen1.height + imagen2.height
-
-    # Copiamos los pixeles al lienzo.
-    resultado = Image.new("RGB", (reusltado_ancho, resultado_alto))
-    resultado.paste(im=imagen1, box=(0, 0))
-    resultado.paste(im=imagen2, box=(0, imagen1.height * 1))
-
-    # Gaurdamos la imagen final.
-    resultado.save("./final.png")
-
-
-if __name__ == "__main__":
-    # Seleccionado
-    # main(
-    #    "las principales presas de Nuevo León",
-    #    "right",
-    #    "CCHNL",
-    #    "CPRNL",
-    #    "LBCNL",
-    #    "PSANL",
-    # )
-    main(
-        "las principales presas del Sistema Cutzamala",
-        "right",
-        "VBRMX",
-        "DBOMC",
-        "VVCMX",
-    )
-
-    # Estatal
-    # main_estatal("las principales presas de Querétaro", "Querétaro", "left")
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+import plotly.graph_objects as go
+import plotly.io as pio
+from PIL import Image
+
+
+ENTIDADES = {
+    "Ags.": "Aguascalientes",
+    "B.C.": "Baja California",
+    "Chih.": "Chihuahua",
+    "Chis.": "Chiapas",
+    "Coah.": "Coahuila",
+    "Col.": "Colima",
+    "Dgo.": "Durango",
+    "Gro.": "Guerrero",
+    "Gto.": "Guanajuato",
+    "Hgo.": "Hidalgo",
+    "Jal.": "Jalisco",
+    "Mich.": "Michoacán",
+    "Mor.": "Morelos",
+    "Méx.": "Edo. de México",
+    "N.L.": "Nuevo León",
+    "Nay.": "Nayarit",
+    "Oax.": "Oaxaca",
+    "Pue.": "Puebla",
+    "Qro.": "Querétaro",
+    "S.L.P.": "San Luis Potosí",
+    "Sin.": "Sinaloa",
+    "Son.": "Sonora",
+    "Tamps.": "Tamaulipas",
+    "Tlax.": "Tlaxcala",
+    "Ver.": "Veracruz",
+    "Zac.": "Zacatecas",
+}
+
+# La fecha que se mostrará en la fuente.
+FECHA_FUENTE = "abril 2024"
+
+# Configuramos el renderizado una sola vez para reutilizar
+# el mismo proceso de Kaleido en todas las gráficas.
+# Las versiones recientes de plotly exponen la configuración
+# en pio.defaults y ya no incluyen el scope anterior.
+if hasattr(pio, "defaults"):
+    pio.defaults.default_format = "png"
+    pio.defaults.default_width = 1280
+    pio.defaults.default_height = 720
+elif hasattr(pio.kaleido, "scope"):
+    pio.kaleido.scope.default_format = "png"
+    pio.kaleido.scope.default_width = 1280
+    pio.kaleido.scope.default_height = 720
+
+# La configuración compartida de los ejes y del lienzo
+# para ambas gráficas de velas.
+XAXES = dict(
+    rangeslider_visible=False,
+    ticks="outside",
+    tickformat="%m<br>%Y",
+    tickfont_size=14,
+    ticklen=10,
+    zeroline=False,
+    tickcolor="#FFFFFF",
+    linewidth=1,
+    showline=True,
+    showgrid=True,
+    gridwidth=0.5,
+    mirror=True,
+    nticks=25,
+)
+
+YAXES = dict(
+    ticks="outside",
+    separatethousands=True,
+    titlefont_size=18,
+    tickfont_size=14,
+    ticklen=10,
+    title_standoff=6,
+    tickcolor="#FFFFFF",
+    linewidth=1,
+    gridwidth=0.5,
+    showline=True,
+    nticks=20,
+    zeroline=True,
+    zerolinewidth=1,
+    mirror=True,
+)
+
+LAYOUT = dict(
+    legend_itemsizing="constant",
+    showlegend=False,
+    legend_borderwidth=1,
+    legend_bordercolor="#FFFFFF",
+    legend_font_size=20,
+    legend_x=0.5,
+    legend_y=0.05,
+    legend_xanchor="center",
+    legend_yanchor="bottom",
+    width=1280,
+    height=720,
+    font_family="Lato",
+    font_color="#FFFFFF",
+    font_size=18,
+    title_x=0.5,
+    title_y=0.975,
+    margin_t=50,
+    margin_r=40,
+    margin_b=100,
+    margin_l=100,
+    title_font_size=22,
+    plot_bgcolor="#000000",
+    paper_bgcolor="#282A3A",
+)
+
+
+def main(titulo, lado, *presas):
+    """
+    Inicia el reporte de la presa especificada.
+
+    Se crean dos gráficas de vela con los datos
+    mensuales de los últimos 15 años.
+
+    Parameters
+    ----------
+    titulo : str
+        El título que utilizaremos para las gráficas.
+
+    lado : str (left|right)
+        El lado donde se posicionará la anotación.
+
+    presas : str
+        Los identificadores de las presas que queremos graficar.
+
+    """
+
+    # Cargamos y filtramos el catálogo de presas.
+    catalogo = cargar_catalogo()
+    catalogo = catalogo[catalogo["clavesih"].isin(presas)]
+
+    # calculamos el NAMO de todas las presas.
+    namo = catalogo["namoalmac"].sum()
+
+    # Obtenemos la lista de nombres comunes de las presas.
+    # Separamos el nombre de la entidad con operaciones vectorizadas.
+    partes = catalogo["nombrecomun"].str.split(", ", n=1, expand=True)
+    estados = partes[1].str.strip().map(ENTIDADES)
+
+    nombres = "<br>".join("• " + partes[0] + ", " + estados)
+
+    # Cargamos los registros consolidados de las presas.
+    # Ordenamos las claves para que el mismo grupo de presas
+    # siempre reutilice la entrada del caché.
+    completo = cargar_datos(tuple(sorted(presas)))
+
+    # Preparamos las cifras absolutas y porcentuales una sola vez.
+    ohlc_abs, ohlc_perc = preparar_ohlc(completo)
+
+    # Llamamos las siguientes funciones para crear las gráficas.
+    imagen1 = plot_candle(ohlc_abs, nombres, namo, titulo, lado)
+    imagen2 = plot_candle_perc(ohlc_perc, nombres, namo, titulo, lado)
+    combinar_imagenes(imagen1, imagen2)
+
+
+def main_estatal(titulo, entidad, lado):
+    """
+    Inicia el reporte de la presa especificada.
+
+    Se crean dos gráficas de vela con los datos
+    mensuales de los últimos 15 años.
+
+    Parameters
+    ----------
+    titulo : str
+        El título que utilizaremos para las gráficas.
+
+    entidad : str
+        El nombre de la entidad federativa que queremos graficar.
+
+    lado : str (left|right)
+        El lado donde se posicionará la anotación.
+
+    """
+
+    # Cargamos y filtramos el catálogo de presas.
+    catalogo = cargar_catalogo()
+    catalogo = catalogo[catalogo["estado"] == entidad]
+
+    claves = catalogo["clavesih"].unique()
+
+    # calculamos el NAMO de todas las presas.
+    namo = catalogo["namoalmac"].sum()
+
+    # Cargamos los registros consolidados de las presas.
+    # Ordenamos las claves para que el mismo grupo de presas
+    # siempre reutilice la entrada del caché.
+    completo = cargar_datos(tuple(sorted(claves)))
+
+    # Preparamos las cifras absolutas y porcentuales una sola vez.
+    ohlc_abs, ohlc_perc = preparar_ohlc(completo)
+
+    # Llamamos las siguientes funciones para crear las gráficas.
+    imagen1 = plot_candle(ohlc_abs, None, namo, titulo, lado)
+    imagen2 = plot_candle_perc(ohlc_perc, None, namo, titulo, lado)
+    combinar_imagenes(imagen1, imagen2)
+
+
+@lru_cache(maxsize=1)
+def cargar_catalogo():
+    """
+    Carga el catálogo de presas.
+
+    El resultado se guarda en memoria para no releer
+    el archivo en cada reporte.
+
+    Returns
+    -------
+    pandas.DataFrame
+        El catálogo de presas.
+
+    """
+
+    return pd.read_csv("./catalogo.csv", engine="pyarrow")
+
+
+@lru_cache(maxsize=None)
+def cargar_datos(claves):
+    """
+    Carga y consolida los registros anuales de las presas especificadas.
+
+    El resultado se guarda en memoria para que generar varios
+    reportes en una misma sesión no repita las lecturas.
+
+    Parameters
+    ----------
+    claves : tuple
+        Los identificadores de las presas que queremos cargar.
+
+    Returns
+    -------
+    pandas.DataFrame
+        El DataFrame con los registros diarios de las presas.
+
+    """
+
+    # Juntamos los archivos anuales más recientes.
+    archivos = archivos_recientes()
+
+    # Nos aseguramos de contar con la versión Parquet de cada archivo.
+    # Convertimos varios archivos a la vez, ya que pyarrow
+    # libera el GIL durante la lectura.
+    with ThreadPoolExecutor(max_workers=8) as ejecutor:
+        rutas = list(ejecutor.map(preparar_parquet, archivos))
+
+    # Escogemos las columnas que vamos a necesitar.
+    cols = ["fechamonitoreo", "clavesih", "almacenaactual", "namoalmac"]
+
+    # Leemos los 15 años como un solo dataset: el filtro poda los
+    # grupos de filas antes de materializarlos y los registros de
+    # nuestras presas se convierten a pandas en una sola pasada.
+    completo = (
+        ds.dataset(rutas, format="parquet")
+        .to_table(columns=cols, filter=ds.field("clavesih").isin(list(claves)))
+        .to_pandas()
+    )
+
+    # Unificamos las categorías de las claves después de unir los años.
+    completo["clavesih"] = completo["clavesih"].astype("category")
+
+    return completo
+
+
+def archivos_recientes(n=15):
+    """
+    Junta los nombres de los archivos CSV anuales más recientes.
+
+    Parameters
+    ----------
+    n : int
+        El número de archivos a conservar.
+
+    Returns
+    -------
+    list
+        Los nombres de los archivos, ordenados por año.
+
+    """
+
+    # Ordenamos explícitamente, ya que el sistema de archivos
+    # no garantiza el orden en que lista los nombres.
+    archivos = sorted(
+        entrada.name
+        for entrada in os.scandir("./data")
+        if entrada.name.endswith(".csv")
+    )
+
+    return archivos[-n:]
+
+
+def preparar_parquet(archivo):
+    """
+    Convierte el archivo CSV anual especificado a Parquet
+    si aún no existe o si el CSV es más reciente.
+
+    Parameters
+    ----------
+    archivo : str
+        El nombre del archivo CSV anual.
+
+    Returns
+    -------
+    str
+        La ruta del archivo Parquet equivalente.
+
+    """
+
+    ruta_csv = f"./data/{archivo}"
+    ruta_parquet = ruta_csv.replace(".csv", ".parquet")
+
+    # Solo convertimos el archivo si hace falta.
+    if not os.path.exists(ruta_parquet) or os.path.getmtime(
+        ruta_parquet
+    ) < os.path.getmtime(ruta_csv):
+        df = pd.read_csv(ruta_csv, parse_dates=["fechamonitoreo"], engine="pyarrow")
+
+        # Reducimos los tipos de las columnas que usan las gráficas:
+        # float32 ocupa la mitad de memoria y clavesih como categoría
+        # hace que los filtros comparen enteros en lugar de texto.
+        df = df.astype(
+            {
+                "clavesih": "category",
+                "almacenaactual": "float32",
+                "namoalmac": "float32",
+            }
+        )
+
+        # Ordenamos por clave para que cada presa quede contigua y
+        # los grupos de filas pequeños permitan saltar las demás.
+        df = df.sort_values(["clavesih", "fechamonitoreo"])
+
+        df.to_parquet(ruta_parquet, index=False, row_group_size=5_000)
+
+    return ruta_parquet
+
+
+def preparar_ohlc(df):
+    """
+    Prepara los valores OHLC mensuales en cifras
+    absolutas y porcentuales.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        El DataFrame con los registros diarios de las presas.
+
+    Returns
+    -------
+    tuple
+        Los DataFrames OHLC con cifras absolutas y porcentuales.
+
+    """
+
+    # Nos quedamos con el último registro de cada presa por día y
+    # después sumamos los totales diarios, sin pasar por una tabla pivote.
+    diario = df.groupby(["fechamonitoreo", "clavesih"], observed=True)[
+        ["almacenaactual", "namoalmac"]
+    ].last()
+
+    diario = diario.groupby("fechamonitoreo").sum()
+
+    # El total de llenado y el NAMO diario de todas las presas.
+    total = diario["almacenaactual"]
+    namo_diario = diario["namoalmac"]
+
+    # Calculamos el porcentaje de llenado de todas las presas.
+    porcentaje = total / namo_diario * 100
+
+    # Quitamos los picos en las series de tiempo y transformamos
+    # los datos en valores OHLC mensuales.
+    # Suavizamos ambas series en una sola pasada.
+    # Quitamos los meses sin registros para no graficar velas vacías.
+    suavizado = mediana_movil(pd.DataFrame({"total": total, "porcentaje": porcentaje}))
+
+    ohlc_abs = ohlc_mensual(suavizado["total"])
+    ohlc_perc = ohlc_mensual(suavizado["porcentaje"])
+
+    return ohlc_abs, ohlc_perc
+
+
+def mediana_movil(df, ventana=7):
+    """
+    Calcula la mediana móvil de las series especificadas.
+
+    Opera directamente sobre el arreglo de NumPy para evitar
+    el despacho genérico de pandas en cada ventana, y suaviza
+    todas las columnas con una sola llamada a np.median.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        Las series de tiempo diarias, una por columna.
+
+    ventana : int
+        El tamaño de la ventana.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Las series suavizadas con el mismo índice.
+
+    """
+
+    valores = df.to_numpy(dtype=np.float32)
+
+    # Las ventanas incompletas del inicio quedan como NaN,
+    # igual que con rolling().median().
+    resultado = np.full(valores.shape, np.nan, dtype=np.float32)
+
+    if len(valores) >= ventana:
+        ventanas = np.lib.stride_tricks.sliding_window_view(valores, ventana, axis=0)
+        resultado[ventana - 1 :] = np.median(ventanas, axis=-1)
+
+    return pd.DataFrame(resultado, index=df.index, columns=df.columns)
+
+
+def ohlc_mensual(serie):
+    """
+    Calcula los valores OHLC mensuales de la serie especificada.
+
+    Recorre el arreglo ordenado con reducciones de NumPy
+    en lugar del despacho genérico de resample.
+
+    Parameters
+    ----------
+    serie : pandas.Series
+        La serie de tiempo diaria suavizada.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Los valores open/high/low/close indexados por
+        el inicio de cada mes.
+
+    """
+
+    # Quitamos los NaN de las ventanas incompletas; los meses sin
+    # registros desaparecen solos, igual que con dropna().
+    valores = serie.to_numpy()
+    mascara = ~np.isnan(valores)
+
+    valores = valores[mascara]
+    fechas = serie.index.to_numpy()[mascara]
+
+    # Sin registros válidos no hay velas que graficar.
+    if not len(valores):
+        return pd.DataFrame(
+            columns=["open", "high", "low", "close"], index=pd.DatetimeIndex([])
+        )
+
+    # Detectamos dónde inicia cada mes sobre el arreglo ordenado.
+    meses = fechas.astype("datetime64[M]")
+    inicios = np.concatenate(([0], np.nonzero(np.diff(meses))[0] + 1))
+
+    return pd.DataFrame(
+        {
+            "open": valores[inicios],
+            "high": np.maximum.reduceat(valores, inicios),
+            "low": np.minimum.reduceat(valores, inicios),
+            "close": valores[np.append(inicios[1:] - 1, len(valores) - 1)],
+        },
+        index=pd.DatetimeIndex(meses[inicios]),
+    )
+
+
+def plot_candle(df, nombres, namo, titulo, lado):
+    """
+    Crea una gráfica de velas con el nivel de almacenamiento
+    de las presas especificadas.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        El DataFrame con los valores OHLC mensuales.
+
+    nombres : str
+        Los nombres comunes de las presas.
+
+    namo : float
+        el nivel de almacenamiento máximo ordinario de todas las presas.
+
+    titulo : str
+        El título de la gráfica.
+
+    lado : str (left|right)
+        El lado donde se posicionará la anotación.
+
+    """
+
+    return plot_velas(
+        df,
+        nombres,
+        namo,
+        titulo,
+        lado,
+        titulo_y="Almacenamiento actual en hm<sup>3</sup>",
+        sufijo_y="",
+    )
+
+
+def plot_candle_perc(df, nombres, namo, titulo, lado):
+    """
+    Crea una gráfica de velas con el nivel de almacenamiento
+    de las presas especificadas.
+
+    A diferencia de la otra función, esta muestra los valores
+    en porcentaje respecto al NAMO total.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        El DataFrame con los valores OHLC mensuales.
+
+    nombres : str
+        Los nombres comunes de las presas.
+
+    namo : float
+        el nivel de almacenamiento máximo ordinario de todas las presas.
+
+    titulo : str
+        El título de la gráfica.
+
+    lado : str (left|right)
+        El lado donde se posicionará la anotación.
+
+    """
+
+    return plot_velas(
+        df,
+        nombres,
+        namo,
+        titulo,
+        lado,
+        titulo_y="Almacenamiento actual respecto al nivel máximo ordinario",
+        sufijo_y="%",
+    )
+
+
+def plot_velas(df, nombres, namo, titulo, lado, titulo_y, sufijo_y):
+    """
+    Construye y renderiza una gráfica de velas.
+
+    Ambas gráficas comparten la misma estructura; solo cambian
+    el eje vertical y la ruta de salida.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        El DataFrame con los valores OHLC mensuales.
+
+    nombres : str
+        Los nombres comunes de las presas.
+
+    namo : float
+        el nivel de almacenamiento máximo ordinario de todas las presas.
+
+    titulo : str
+        El título de la gráfica.
+
+    lado : str (left|right)
+        El lado donde se posicionará la anotación.
+
+    titulo_y : str
+        El título del eje vertical.
+
+    sufijo_y : str
+        El sufijo de las etiquetas del eje vertical.
+
+    Returns
+    -------
+    bytes
+        Los bytes PNG de la imagen renderizada.
+
+    """
+
+    # Ajustamos el texto de la anotación.
+    if nombres is None:
+        nota = "<b>Nota:</b><br>Cada vela representa las cifras mensuales<br>de las principales presas del estado."
+    else:
+        nota = f"<b>Nota:</b><br>Cada vela representa las cifras<br>mensuales de las presas:<br>{nombres}"
+
+    if lado == "left":
+        xanchor = "left"
+        x_pos = 0.02
+    else:
+        xanchor = "right"
+        x_pos = 1.0
+
+    fig = go.Figure()
+
+    fig.add_trace(
+        go.Candlestick(
+            x=df.index,
+            open=df["open"],
+            high=df["high"],
+            low=df["low"],
+            close=df["close"],
+            increasing_line_color="#84ffff",
+            decreasing_line_color="#ff9800",
+        )
+    )
+
+    fig.update_xaxes(**XAXES)
+
+    fig.update_yaxes(title=titulo_y, ticksuffix=sufijo_y, **YAXES)
+
+    fig.update_layout(
+        title_text=f"Evolución del volumen de almacenamiento de {titulo} (NAMO: <b>{namo:,.1f} hm<sup>3</sup></b>)",
+        **LAYOUT,
+        annotations=crear_anotaciones(nota, x_pos, xanchor),
+    )
+
+    # Renderizamos la imagen con el proceso compartido de Kaleido.
+    return pio.to_image(fig, validate=False)
+
+
+def crear_anotaciones(nota, x_pos, xanchor):
+    """
+    Construye la lista de anotaciones de las gráficas.
+
+    Solo la nota y su posición cambian entre gráficas; el resto
+    de los campos son fijos.
+
+    Parameters
+    ----------
+    nota : str
+        El texto de la nota principal.
+
+    x_pos : float
+        La posición horizontal de la nota.
+
+    xanchor : str (left|right)
+        El anclaje horizontal de la nota.
+
+    Returns
+    -------
+    list
+        Las anotaciones listas para update_layout.
+
+    """
+
+    return [
+        dict(
+            x=x_pos,
+            y=0.93,
+            xref="paper",
+            yref="paper",
+            xanchor=xanchor,
+            yanchor="top",
+            borderpad=7,
+            bordercolor="#FFFFFF",
+            borderwidth=1,
+            bgcolor="#000000",
+            align="left",
+            text=nota,
+        ),
+        dict(
+            x=0.01,
+            y=-0.16,
+            xref="paper",
+            yref="paper",
+            xanchor="left",
+            yanchor="top",
+            text=f"Fuente: CONAGUA ({FECHA_FUENTE})",
+        ),
+        dict(
+            x=0.5,
+            y=-0.16,
+            xref="paper",
+            yref="paper",
+            xanchor="center",
+            yanchor="top",
+            text="Mes y año de registro",
+        ),
+        dict(
+            x=1.01,
+            y=-0.16,
+            xref="paper",
+            yref="paper",
+            xanchor="right",
+            yanchor="top",
+            text="🧁 @lapanquecita",
+        ),
+    ]
+
+
+def combinar_imagenes(imagen1, imagen2):
+    """
+    Esta función une las dos imágenes generadas por
+    las otras funciones.
+
+    Parameters
+    ----------
+    imagen1 : bytes
+        Los bytes PNG de la primera imagen.
+
+    imagen2 : bytes
+        Los bytes PNG de la segunda imagen.
+
+    """
+
+    # Cargamos las imágenes directamente desde la memoria.
+    imagen1 = Image.open(BytesIO(imagen1))
+    imagen2 = Image.open(BytesIO(imagen2))
+
+    # Apilamos los pixeles de ambas imágenes en una sola copia.
+    # Quitamos el canal alfa de Kaleido para publicar
+    # la imagen en RGB, igual que antes.
+    resultado = Image.fromarray(
+        np.concatenate([np.asarray(imagen1), np.asarray(imagen2)], axis=0)
+    ).convert("RGB")
+
+    # Gaurdamos la imagen final.
+    resultado.save("./final.png")
+
+
+if __name__ == "__main__":
+    # Seleccionado
+    # main(
+    #    "las principales presas de Nuevo León",
+    #    "right",
+    #    "CCHNL",
+    #    "CPRNL",
+    #    "LBCNL",
+    #    "PSANL",
+    # )
+    main(
+        "las principales presas del Sistema Cutzamala",
+        "right",
+        "VBRMX",
+        "DBOMC",
+        "VVCMX",
+    )
+
+    # Estatal
+    # main_estatal("las principales presas de Querétaro", "Querétaro", "left")